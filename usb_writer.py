@@ -10,7 +10,9 @@ Cross-platform (Linux/macOS/Windows) helper to:
 WARNING: This script WILL ERASE the selected target device. Use only on devices you own.
 
 Limitations / Notes:
-- On Unix (Linux/macOS) it uses `lsblk`/`diskutil`, `parted`/`sgdisk` and `dd`.
+- On Unix (Linux/macOS) it uses `lsblk`/`diskutil` and `parted`/`sgdisk`.
+- The ISO is written in-process: through io_uring from a mapping of the ISO on x86 Linux >= 5.6, otherwise with
+  sendfile/copy_file_range (or a plain read/write loop on macOS).
 - On Windows it shells out to PowerShell's Get-Disk and uses diskpart to format; raw write is not provided natively here (recommend using Rufus/win32-imager for complex Windows flows).
 - Must be run as root/Administrator.
 
@@ -19,27 +21,51 @@ This script is provided as an example and starting point for a safer GUI/tool. A
 Usage examples:
   sudo python3 usb_writer.py --list
   sudo python3 usb_writer.py --target /dev/sdb --iso linux.iso --parttable gpt --format ext4
+  sudo python3 usb_writer.py --target /dev/sdb --iso linux.iso --verify
   python usb_writer.py --list  # on Windows run in elevated PowerShell
 
 """
 
 import argparse
+import ctypes
+import errno
+import hashlib
+import json
+import mmap
 import os
 import platform
 import shutil
+import stat
+import struct
 import subprocess
 import sys
-from pathlib import Path
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Resolved once; every helper below reads these instead of re-probing.
+SYSTEM = platform.system()
+HAS_SGDISK = shutil.which("sgdisk") is not None
+HAS_PARTED = shutil.which("parted") is not None
+# PowerShell 7 (pwsh) starts faster than Windows PowerShell when installed;
+# skip profiles and prompts, which dominate the cost of a one-shot command.
+POWERSHELL = [
+    "pwsh" if SYSTEM == "Windows" and shutil.which("pwsh") else "powershell",
+    "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass", "-Command",
+]
 
 
 def check_root():
-    if platform.system() in ("Linux", "Darwin"):
+    if SYSTEM in ("Linux", "Darwin"):
         if os.geteuid() != 0:
             sys.exit("This script must be run as root (sudo). Exiting.")
-    elif platform.system() == "Windows":
+    elif SYSTEM == "Windows":
         # On Windows, best-effort admin check
         try:
-            import ctypes
             if not ctypes.windll.shell32.IsUserAnAdmin():
                 sys.exit("Please run this script from an elevated Administrator PowerShell. Exiting.")
         except Exception:
@@ -47,125 +73,821 @@ def check_root():
 
 
 # --------- Disk listing helpers ---------
+def _stream(cmd):
+    # Let the child write straight to our stdout (no capture/decode/print)
+    sys.stdout.flush()
+    subprocess.run(cmd, stdout=sys.stdout.buffer, check=True)
+
+
+def _human_size(n):
+    n = float(n or 0)
+    for unit in ("B", "K", "M", "G", "T"):
+        if n < 1024 or unit == "T":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def _print_table(rows, columns):
+    # rows: list of dicts; columns: (header, key) pairs
+    cells = [[h for h, _ in columns]]
+    cells += [["" if row.get(k) is None else str(row[k]) for _, k in columns] for row in rows]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(columns))]
+    for r in cells:
+        print("  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip())
+
+
+def _flatten_lsblk(devices, depth=0):
+    for dev in devices:
+        row = dict(dev)
+        row["name"] = "  " * depth + dev["name"]
+        row["size"] = _human_size(dev.get("size"))
+        yield row
+        yield from _flatten_lsblk(dev.get("children", []), depth + 1)
+
+
 def list_disks_unix():
-    # Prefer lsblk for Linux
+    # Prefer lsblk for Linux: JSON output, parsed and returned for callers
     try:
-        out = subprocess.check_output(["lsblk", "-o", "NAME,SIZE,TYPE,MOUNTPOINT,MODEL,TRAN"], text=True)
-        print(out)
-        return
+        out = subprocess.check_output(["lsblk", "-J", "-b", "-o", "NAME,SIZE,TYPE,MOUNTPOINT,MODEL,TRAN"])
+        disks = json.loads(out)
+        _print_table(list(_flatten_lsblk(disks.get("blockdevices", []))),
+                     [("NAME", "name"), ("SIZE", "size"), ("TYPE", "type"),
+                      ("MOUNTPOINT", "mountpoint"), ("MODEL", "model"), ("TRAN", "tran")])
+        return disks
     except Exception:
         pass
     # Fallback to /proc/partitions
     try:
-        out = subprocess.check_output(["cat", "/proc/partitions"], text=True)
-        print(out)
+        with open("/proc/partitions", "rb") as f:
+            sys.stdout.flush()
+            sys.stdout.buffer.write(f.read())
     except Exception as e:
         print("Failed to list disks:", e)
 
 
 def list_disks_mac():
     try:
-        out = subprocess.check_output(["diskutil", "list"], text=True)
-        print(out)
+        _stream(["diskutil", "list"])
     except Exception as e:
         print("Failed to list disks with diskutil:", e)
 
 
 def list_disks_windows():
-    # Use PowerShell Get-Disk
+    # Use PowerShell Get-Disk; JSON instead of Format-Table so it can be parsed
     try:
-        cmd = ["powershell", "-Command", "Get-Disk | Format-Table -AutoSize"]
-        out = subprocess.check_output(cmd, text=True)
-        print(out)
+        cmd = POWERSHELL + ["Get-Disk | Select-Object Number,FriendlyName,Size,BusType | ConvertTo-Json"]
+        out = subprocess.check_output(cmd)
+        disks = json.loads(out) if out.strip() else []
+        if isinstance(disks, dict):
+            # ConvertTo-Json emits a bare object for a single disk
+            disks = [disks]
+        _print_table([dict(d, Size=_human_size(d.get("Size"))) for d in disks],
+                     [("Number", "Number"), ("FriendlyName", "FriendlyName"),
+                      ("Size", "Size"), ("BusType", "BusType")])
+        return disks
     except Exception as e:
         print("Failed to list disks via PowerShell:", e)
 
 
+LIST_DISKS = {
+    "Linux": list_disks_unix,
+    "Darwin": list_disks_mac,
+    "Windows": list_disks_windows,
+}
+
+
 def list_disks():
-    system = platform.system()
-    print(f"Detected OS: {system}\n")
-    if system == "Linux":
-        list_disks_unix()
-    elif system == "Darwin":
-        list_disks_mac()
-    elif system == "Windows":
-        list_disks_windows()
-    else:
+    print(f"Detected OS: {SYSTEM}\n")
+    lister = LIST_DISKS.get(SYSTEM)
+    if lister is None:
         print("Unsupported OS for automatic disk listing")
+        return None
+    # Parsed listing (lsblk/Get-Disk JSON) or None when only text was printed
+    return lister()
 
 
 # --------- Partition table creation ---------
+# parted names for our --parttable / --format values
+PARTED_LABELS = {"gpt": "gpt", "mbr": "msdos"}
+PARTED_FS_TYPES = {"vfat": "fat32"}
+# first partition node: /dev/sdb -> /dev/sdb1 (Linux), /dev/disk2 -> /dev/disk2s1 (macOS)
+PARTITION_SUFFIX = {"Linux": "1", "Darwin": "s1"}
+
+
+def _run_tool(cmd):
+    try:
+        subprocess.check_call(cmd)
+    except subprocess.CalledProcessError as e:
+        print(f"{cmd[0]} failed:", e)
+
+
+def _pick_partition_tools():
+    # Map table -> labeller, chosen once from the tools found on $PATH.
+    def sgdisk_gpt(device):
+        # wipe GPT+MBR structures, then write a fresh empty GPT
+        _run_tool(["sgdisk", "--zap-all", "-o", device])
+
+    def parted_label(table):
+        def label(device):
+            _run_tool(["parted", "-s", device, "mklabel", PARTED_LABELS[table]])
+        return label
+
+    def missing(msg):
+        def fail(device):
+            raise SystemExit(msg)
+        return fail
+
+    tools = {}
+    if HAS_SGDISK:
+        tools["gpt"] = sgdisk_gpt
+    elif HAS_PARTED:
+        tools["gpt"] = parted_label("gpt")
+    else:
+        tools["gpt"] = missing("Neither sgdisk nor parted found. Install parted (or gdisk) and retry.")
+    # sgdisk only writes GPT; an MBR label always comes from parted
+    tools["mbr"] = parted_label("mbr") if HAS_PARTED else missing("parted not available. Install parted and retry.")
+    return tools
+
+
+PARTITION_TOOLS = _pick_partition_tools()
+
+
 def create_partition_table_unix(device, table):
     # table: 'gpt' or 'mbr'
-    if shutil.which("sgdisk"):
-        if table == "gpt":
-            cmd = ["sgdisk", "--zap-all", device]
-        else:
-            # write MBR using sgdisk conversion
-            cmd = ["sgdisk", "--mbrtogpt=1", device]
-            # note: --mbrtogpt converts MBR->GPT; forcing MBR creation is easier with parted
-        try:
-            subprocess.check_call(cmd)
-        except subprocess.CalledProcessError as e:
-            print("sgdisk failed:", e)
-    elif shutil.which("parted"):
-        try:
-            subprocess.check_call(["parted", "-s", device, "mklabel", table])
-        except subprocess.CalledProcessError as e:
-            print("parted failed:", e)
-    else:
-        raise SystemExit("Neither sgdisk nor parted found. Install parted (or gdisk) and retry.")
+    PARTITION_TOOLS[table](device)
 
 
-def format_partition_unix(device, fs_type="ext4"):
-    # For simplicity, create a single partition spanning entire disk then format it
-    # device example: /dev/sdb -> partition /dev/sdb1 (Linux) or /dev/disk2 -> /dev/disk2s1 (mac)
-    # We'll use parted to make a primary partition
-    if not shutil.which("parted"):
+def partition_and_format_unix(device, table, fs_type="ext4"):
+    # Label the disk and create one partition spanning it in a single parted
+    # invocation (parted runs several commands per call), then format it.
+    mkcmd = _mkfs_command(fs_type)
+    if not HAS_PARTED:
         raise SystemExit("parted not available. Install parted and retry.")
+    cmd = ["parted", "-s", device,
+           "mklabel", PARTED_LABELS[table],
+           "mkpart", "primary", PARTED_FS_TYPES.get(fs_type, fs_type), "0%", "100%"]
     try:
-        subprocess.check_call(["parted", "-s", device, "mkpart", "primary", fs_type, "0%", "100%"])
+        subprocess.check_call(cmd)
     except subprocess.CalledProcessError as e:
         print("Failed to create partition:", e)
         return
-    # Find partition path (simple heuristic)
-    part = None
-    if platform.system() == "Linux":
-        part = device + "1"
-    elif platform.system() == "Darwin":
-        # macOS naming: /dev/disk2 -> /dev/disk2s1
-        part = device + "s1"
-    else:
-        raise SystemExit("Unsupported OS for formatting partitions via this script")
-    # Wait a moment for kernel to settle
-    subprocess.call(["sleep", "1"]) if platform.system() != "Windows" else None
-    # Format
+    format_partition_unix(device, fs_type, mkcmd)
+
+
+def _wait_for_node(path, timeout=2.0, interval=0.05):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(interval)
+
+
+def _mkfs_command(fs_type):
+    # mkfs argv without the partition path
     if fs_type in ("ext4", "ext3", "ext2"):
-        mkcmd = ["mkfs." + fs_type, part]
+        return ["mkfs." + fs_type]
     elif fs_type in ("vfat", "fat32"):
-        mkcmd = ["mkfs.vfat", part]
+        return ["mkfs.vfat"]
     elif fs_type == "ntfs":
-        mkcmd = ["mkfs.ntfs", part]
-    else:
-        raise SystemExit("Unsupported filesystem: " + fs_type)
+        return ["mkfs.ntfs"]
+    raise SystemExit("Unsupported filesystem: " + fs_type)
+
+
+def format_partition_unix(device, fs_type="ext4", mkcmd=None):
+    # Format the first partition of device (created by partition_and_format_unix)
+    # device example: /dev/sdb -> partition /dev/sdb1 (Linux) or /dev/disk2 -> /dev/disk2s1 (mac)
+    if mkcmd is None:
+        mkcmd = _mkfs_command(fs_type)
+    # Find partition path (simple heuristic)
+    if SYSTEM not in PARTITION_SUFFIX:
+        raise SystemExit("Unsupported OS for formatting partitions via this script")
+    part = device + PARTITION_SUFFIX[SYSTEM]
+    # Wait for the kernel/udev to create the partition node
+    _wait_for_node(part)
     try:
-        subprocess.check_call(mkcmd)
+        subprocess.check_call(mkcmd + [part])
     except subprocess.CalledProcessError as e:
         print("mkfs failed:", e)
 
 
-def write_iso_unix(device, iso_path):
-    # Use dd for raw writing. This will overwrite entire device.
-    if not Path(iso_path).exists():
+# --------- io_uring helpers (Linux) ---------
+# Minimal binding over the raw syscalls so no third-party package is needed.
+_NR_IO_URING_SETUP = 425
+_NR_IO_URING_ENTER = 426
+_NR_IO_URING_REGISTER = 427
+
+IORING_OFF_SQ_RING = 0
+IORING_OFF_CQ_RING = 0x8000000
+IORING_OFF_SQES = 0x10000000
+
+IORING_OP_READ_FIXED = 4
+IORING_OP_WRITE = 23
+IORING_SETUP_SQPOLL = 1 << 1
+IORING_SQ_NEED_WAKEUP = 1 << 0
+IORING_ENTER_GETEVENTS = 1
+IORING_ENTER_SQ_WAKEUP = 1 << 1
+IORING_REGISTER_BUFFERS = 0
+
+URING_MIN_KERNEL = (5, 6)
+# Before 5.11 SQPOLL needs CAP_SYS_ADMIN and registered files.
+SQPOLL_MIN_KERNEL = (5, 11)
+SQPOLL_IDLE_MS = 2000
+X86_MACHINES = ("x86_64", "i686", "i386")
+URING_ENTRIES = 256
+URING_SLOTS = 16
+URING_CHUNK = 4 << 20
+DIRECT_ALIGN = 4096
+BLKSSZGET = 0x1268
+BLKDISCARD = 0x1277
+BLKGETSIZE64 = 0x80081272
+MIN_BLOCK_SIZE = 1 << 20
+MAX_BLOCK_SIZE = 16 << 20
+# macOS <sys/disk.h>
+DKIOCGETBLOCKSIZE = 0x40046418
+DKIOCGETPHYSICALBLOCKSIZE = 0x4004644D
+DKIOCGETMAXBLOCKCOUNTWRITE = 0x40086441
+
+
+class _SqringOffsets(ctypes.Structure):
+    _fields_ = [("head", ctypes.c_uint32), ("tail", ctypes.c_uint32),
+                ("ring_mask", ctypes.c_uint32), ("ring_entries", ctypes.c_uint32),
+                ("flags", ctypes.c_uint32), ("dropped", ctypes.c_uint32),
+                ("array", ctypes.c_uint32), ("resv1", ctypes.c_uint32),
+                ("user_addr", ctypes.c_uint64)]
+
+
+class _CqringOffsets(ctypes.Structure):
+    _fields_ = [("head", ctypes.c_uint32), ("tail", ctypes.c_uint32),
+                ("ring_mask", ctypes.c_uint32), ("ring_entries", ctypes.c_uint32),
+                ("overflow", ctypes.c_uint32), ("cqes", ctypes.c_uint32),
+                ("flags", ctypes.c_uint32), ("resv1", ctypes.c_uint32),
+                ("user_addr", ctypes.c_uint64)]
+
+
+class _UringParams(ctypes.Structure):
+    _fields_ = [("sq_entries", ctypes.c_uint32), ("cq_entries", ctypes.c_uint32),
+                ("flags", ctypes.c_uint32), ("sq_thread_cpu", ctypes.c_uint32),
+                ("sq_thread_idle", ctypes.c_uint32), ("features", ctypes.c_uint32),
+                ("wq_fd", ctypes.c_uint32), ("resv", ctypes.c_uint32 * 3),
+                ("sq_off", _SqringOffsets), ("cq_off", _CqringOffsets)]
+
+
+class _Sqe(ctypes.Structure):
+    _fields_ = [("opcode", ctypes.c_uint8), ("flags", ctypes.c_uint8),
+                ("ioprio", ctypes.c_uint16), ("fd", ctypes.c_int32),
+                ("off", ctypes.c_uint64), ("addr", ctypes.c_uint64),
+                ("len", ctypes.c_uint32), ("rw_flags", ctypes.c_uint32),
+                ("user_data", ctypes.c_uint64), ("buf_index", ctypes.c_uint16),
+                ("personality", ctypes.c_uint16), ("splice_fd_in", ctypes.c_int32),
+                ("addr3", ctypes.c_uint64), ("pad", ctypes.c_uint64)]
+
+
+class _Cqe(ctypes.Structure):
+    _fields_ = [("user_data", ctypes.c_uint64), ("res", ctypes.c_int32),
+                ("flags", ctypes.c_uint32)]
+
+
+class _Iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class UringUnavailable(Exception):
+    """io_uring cannot be used here; callers fall back to another writer."""
+
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.syscall.restype = ctypes.c_long
+        _libc.memcmp.restype = ctypes.c_int
+        _libc.memcmp.argtypes = (ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+    return _libc
+
+
+def _syscall(nr, *args):
+    ret = _get_libc().syscall(ctypes.c_long(nr), *args)
+    if ret < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return ret
+
+
+def _addr(buf):
+    # Address of a writable buffer (mmap); the buffer must outlive its users.
+    c = ctypes.c_char.from_buffer(buf)
+    addr = ctypes.addressof(c)
+    del c
+    return addr
+
+
+def _kernel_version():
+    parts = platform.release().split("-")[0].split(".")
+    try:
+        return tuple(int(x) for x in parts[:2])
+    except ValueError:
+        return (0, 0)
+
+
+KERNEL_VERSION = _kernel_version() if SYSTEM == "Linux" else (0, 0)
+
+
+class _Uring:
+    # Single-threaded submission/completion ring over mmap'd kernel memory.
+
+    def __init__(self, entries, flags=0, sq_thread_idle=0):
+        p = _UringParams()
+        p.flags = flags
+        p.sq_thread_idle = sq_thread_idle
+        self.sqpoll = bool(flags & IORING_SETUP_SQPOLL)
+        self.fd = _syscall(_NR_IO_URING_SETUP, ctypes.c_long(entries), ctypes.byref(p))
+        self._maps = []
+        try:
+            sq = self._map(p.sq_off.array + p.sq_entries * 4, IORING_OFF_SQ_RING)
+            cq = self._map(p.cq_off.cqes + p.cq_entries * ctypes.sizeof(_Cqe), IORING_OFF_CQ_RING)
+            sqes = self._map(p.sq_entries * ctypes.sizeof(_Sqe), IORING_OFF_SQES)
+        except OSError:
+            self.close()
+            raise
+        u32 = ctypes.c_uint32
+        self._sq_head = u32.from_address(sq + p.sq_off.head)
+        self._sq_tail = u32.from_address(sq + p.sq_off.tail)
+        self._sq_mask = u32.from_address(sq + p.sq_off.ring_mask).value
+        self._sq_flags = u32.from_address(sq + p.sq_off.flags)
+        self._sq_entries = p.sq_entries
+        self._sq_array = (u32 * p.sq_entries).from_address(sq + p.sq_off.array)
+        self._sqes = (_Sqe * p.sq_entries).from_address(sqes)
+        self._cq_head = u32.from_address(cq + p.cq_off.head)
+        self._cq_tail = u32.from_address(cq + p.cq_off.tail)
+        self._cq_mask = u32.from_address(cq + p.cq_off.ring_mask).value
+        self._cqes = (_Cqe * p.cq_entries).from_address(cq + p.cq_off.cqes)
+        self._local_tail = self._sq_tail.value
+
+    def _map(self, size, offset):
+        m = mmap.mmap(self.fd, size, mmap.MAP_SHARED | getattr(mmap, "MAP_POPULATE", 0),
+                      mmap.PROT_READ | mmap.PROT_WRITE, offset=offset)
+        self._maps.append(m)
+        return _addr(m)
+
+    def register_buffers(self, bufs):
+        iovs = (_Iovec * len(bufs))(*[_Iovec(_addr(b), len(b)) for b in bufs])
+        _syscall(_NR_IO_URING_REGISTER, ctypes.c_long(self.fd), ctypes.c_long(IORING_REGISTER_BUFFERS),
+                 ctypes.byref(iovs), ctypes.c_long(len(bufs)))
+
+    def get_sqe(self):
+        if (self._local_tail - self._sq_head.value) & 0xFFFFFFFF >= self._sq_entries:
+            return None
+        idx = self._local_tail & self._sq_mask
+        sqe = self._sqes[idx]
+        ctypes.memset(ctypes.addressof(sqe), 0, ctypes.sizeof(_Sqe))
+        self._sq_array[idx] = idx
+        self._local_tail = (self._local_tail + 1) & 0xFFFFFFFF
+        return sqe
+
+    def submit(self):
+        # Publish every prepared SQE. With SQPOLL the kernel thread picks them
+        # up from shared memory and io_uring_enter is only needed to wake it
+        # after it has gone idle; otherwise one io_uring_enter covers the batch.
+        pending = (self._local_tail - self._sq_tail.value) & 0xFFFFFFFF
+        if not pending:
+            return 0
+        self._sq_tail.value = self._local_tail
+        if self.sqpoll:
+            if self._sq_flags.value & IORING_SQ_NEED_WAKEUP:
+                self._enter(0, 0, IORING_ENTER_SQ_WAKEUP)
+            return pending
+        return self._enter(pending, 0, 0)
+
+    def wait_cqe(self):
+        # Block for the next completion and mark it seen; returns (user_data, res).
+        while True:
+            head = self._cq_head.value
+            if head != self._cq_tail.value:
+                cqe = self._cqes[head & self._cq_mask]
+                user_data, res = cqe.user_data, cqe.res
+                self._cq_head.value = (head + 1) & 0xFFFFFFFF
+                return user_data, res
+            flags = IORING_ENTER_GETEVENTS
+            if self.sqpoll:
+                # submit() reads NEED_WAKEUP right after storing the tail with
+                # no full barrier, so it can miss that the poller went idle.
+                # Waking it here before blocking means a missed wakeup cannot
+                # leave SQEs unsubmitted while we wait; an extra wake is harmless.
+                flags |= IORING_ENTER_SQ_WAKEUP
+            self._enter(0, 1, flags)
+
+    def reap(self):
+        # Wait for at least one completion, then drain every ready CQE.
+        done = [self.wait_cqe()]
+        while self._cq_head.value != self._cq_tail.value:
+            done.append(self.wait_cqe())
+        return done
+
+    def _enter(self, to_submit, min_complete, flags):
+        while True:
+            try:
+                return _syscall(_NR_IO_URING_ENTER, ctypes.c_long(self.fd), ctypes.c_long(to_submit),
+                                ctypes.c_long(min_complete), ctypes.c_long(flags), None, ctypes.c_long(0))
+            except InterruptedError:
+                continue
+
+    def close(self):
+        for m in self._maps:
+            m.close()
+        self._maps = []
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def _open_uring():
+    if KERNEL_VERSION < URING_MIN_KERNEL:
+        raise UringUnavailable("kernel %s has no usable io_uring" % platform.release())
+    # Python cannot issue acquire/release barriers, so the rings are only
+    # safe to drive where the hardware orders them for us: x86's TSO keeps
+    # SQE stores before the tail store, and CQE loads after the cq_tail load
+    # that published them. Weakly ordered CPUs (aarch64, ...) could see a
+    # stale CQE in wait_cqe()/reap(), so they use the sendfile writer.
+    if platform.machine() not in X86_MACHINES:
+        raise UringUnavailable("io_uring ring access needs x86 memory ordering (%s)" % platform.machine())
+    # TSO still lets the tail store pass the NEED_WAKEUP load in submit();
+    # wait_cqe() covers that by always passing SQ_WAKEUP when it blocks.
+    if KERNEL_VERSION >= SQPOLL_MIN_KERNEL:
+        try:
+            return _Uring(URING_ENTRIES, IORING_SETUP_SQPOLL, SQPOLL_IDLE_MS)
+        except OSError:
+            pass
+    try:
+        return _Uring(URING_ENTRIES)
+    except OSError as e:
+        raise UringUnavailable("io_uring_setup failed: %s" % e) from e
+
+
+def _logical_block_size(fd):
+    # Device logical block size (BLKSSZGET); regular files report ENOTTY.
+    try:
+        buf = fcntl.ioctl(fd, BLKSSZGET, b"\0" * 4)
+    except OSError:
+        return DIRECT_ALIGN
+    return int.from_bytes(buf, sys.byteorder) or DIRECT_ALIGN
+
+
+def _open_target(device):
+    # Open the target with O_DIRECT | O_SYNC so writes DMA straight from our
+    # buffers and are durable as they complete instead of in one final stall.
+    # Returns (fd, align); align == 1 means O_DIRECT was refused and the caller
+    # must drop written pages from the cache itself.
+    try:
+        fd = os.open(device, os.O_WRONLY | os.O_DIRECT | os.O_SYNC)
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+        print(f"O_DIRECT not supported on {device}; using buffered writes")
+        return os.open(device, os.O_WRONLY | os.O_SYNC), 1
+    return fd, _logical_block_size(fd)
+
+
+def _sysfs_queue_limits(device):
+    # (optimal_io_size, minimum_io_size, logical_block_size) from sysfs; a
+    # partition has no queue/ of its own so its parent disk's is used.
+    node = os.path.realpath("/sys/class/block/" + os.path.basename(os.path.realpath(device)))
+    for base in (node, os.path.dirname(node)):
+        queue = os.path.join(base, "queue")
+        if os.path.isdir(queue):
+            limits = []
+            for name in ("optimal_io_size", "minimum_io_size", "logical_block_size"):
+                with open(os.path.join(queue, name)) as f:
+                    limits.append(int(f.read()))
+            return tuple(limits)
+    return None
+
+
+def _mac_queue_limits(device):
+    fd = os.open(device, os.O_RDONLY)
+    try:
+        logical = int.from_bytes(fcntl.ioctl(fd, DKIOCGETBLOCKSIZE, b"\0" * 4), sys.byteorder)
+        physical = int.from_bytes(fcntl.ioctl(fd, DKIOCGETPHYSICALBLOCKSIZE, b"\0" * 4), sys.byteorder)
+        max_count = int.from_bytes(fcntl.ioctl(fd, DKIOCGETMAXBLOCKCOUNTWRITE, b"\0" * 8), sys.byteorder)
+    finally:
+        os.close(fd)
+    return max_count * logical, physical, logical
+
+
+def choose_block_size(device):
+    # Pick the transfer size from the device's reported optimal I/O size
+    # (at least 1 MiB, capped at 16 MiB, a multiple of the logical block
+    # size); devices that report nothing keep the 4 MiB default.
+    limits = None
+    try:
+        if SYSTEM == "Linux":
+            limits = _sysfs_queue_limits(device)
+        elif SYSTEM == "Darwin":
+            limits = _mac_queue_limits(device)
+    except (OSError, ValueError):
+        pass
+    if not limits or not limits[0]:
+        print(f"Block size: {URING_CHUNK} bytes (device reports no optimal I/O size)")
+        return URING_CHUNK
+    optimal, minimum, logical = limits
+    logical = logical or 512
+    bs = min(max(optimal, minimum, MIN_BLOCK_SIZE), MAX_BLOCK_SIZE)
+    bs = -(-bs // logical) * logical
+    print(f"Block size: {bs} bytes (optimal {optimal}, minimum {minimum}, logical {logical})")
+    return bs
+
+
+def _prep_rw(sqe, opcode, fd, addr, length, offset, user_data, buf_index=0):
+    sqe.opcode = opcode
+    sqe.fd = fd
+    sqe.off = offset
+    sqe.addr = addr
+    sqe.len = length
+    sqe.buf_index = buf_index
+    sqe.user_data = user_data
+
+
+PROGRESS_INTERVAL = 0.5
+
+
+def print_progress(done, total):
+    # Default progress callback: one \r-rewritten stderr line per tick;
+    # total is None while streaming a source of unknown length
+    if total is None:
+        sys.stderr.write(f"\r{done >> 20} MiB")
+        sys.stderr.flush()
+        return
+    pct = done * 100 // total if total else 100
+    end = "\n" if done >= total else ""
+    sys.stderr.write(f"\r{done >> 20}/{total >> 20} MiB ({pct}%){end}")
+    sys.stderr.flush()
+
+
+class _Progress:
+    # Accumulates completed bytes and calls callback(done, total) at most
+    # once per PROGRESS_INTERVAL, plus once when the copy finishes.
+
+    def __init__(self, total, callback):
+        self.total = total
+        self.done = 0
+        self._callback = callback
+        self._last = time.monotonic()
+
+    def add(self, n):
+        self.done += n
+        if self._callback is None:
+            return
+        now = time.monotonic()
+        finished = self.total is not None and self.done >= self.total
+        if now - self._last >= PROGRESS_INTERVAL or finished:
+            self._last = now
+            self._callback(self.done, self.total)
+
+
+def write_iso_uring(device, iso_path, bs=URING_CHUNK, progress=None, size=None):
+    # Raw write through io_uring straight out of a MAP_PRIVATE mapping of the
+    # ISO: each IORING_OP_WRITE points into the mapping, so the kernel DMAs
+    # from the ISO's page cache with no user-space copy and no read SQEs.
+    # Up to URING_SLOTS writes are in flight; MADV_WILLNEED keeps readahead
+    # one window ahead of them. progress(done, total) is fed from the
+    # write completions. user_data = slot.
+    ring = _open_uring()
+    iso = tail = None
+    in_fd = out_fd = -1
+    try:
+        in_fd = os.open(iso_path, os.O_RDONLY)
+        if size is None:
+            size = os.fstat(in_fd).st_size
+        if size:
+            # Map before touching the target so a source that cannot be
+            # mapped (ENODEV, ENOMEM, too large for a 32-bit address space)
+            # falls back to the sendfile writer with nothing written yet.
+            # Writable only so ctypes can take its address; never written to.
+            try:
+                iso = mmap.mmap(in_fd, size, mmap.MAP_PRIVATE, mmap.PROT_READ | mmap.PROT_WRITE)
+            except (OSError, OverflowError, ValueError) as e:
+                raise UringUnavailable("cannot mmap %s: %s" % (iso_path, e)) from e
+            iso.madvise(mmap.MADV_SEQUENTIAL)
+            base = _addr(iso)
+        out_fd, align = _open_target(device)
+        chunk = bs // align * align
+        window = chunk * URING_SLOTS
+        tracker = _Progress(size, progress)
+        lengths = [0] * URING_SLOTS
+        sizes = [0] * URING_SLOTS
+        offsets = [0] * URING_SLOTS
+        free = list(range(URING_SLOTS))
+        offset = 0
+        prefetched = 0
+        inflight = 0
+        while True:
+            while free and offset < size:
+                i = free.pop()
+                n = min(chunk, size - offset)
+                length = -(-n // align) * align
+                if length == n:
+                    addr = base + offset
+                else:
+                    # O_DIRECT needs block-aligned lengths: write the final
+                    # chunk from a zero-padded bounce buffer
+                    tail = mmap.mmap(-1, length)
+                    tail[:n] = iso[offset:size]
+                    addr = _addr(tail)
+                if prefetched < size and prefetched < offset + window:
+                    ahead = min(window, size - prefetched)
+                    iso.madvise(mmap.MADV_WILLNEED, prefetched, ahead)
+                    prefetched += ahead
+                _prep_rw(ring.get_sqe(), IORING_OP_WRITE, out_fd, addr, length, offset, i)
+                lengths[i] = length
+                sizes[i] = n
+                offsets[i] = offset
+                offset += n
+                inflight += 1
+            if not inflight:
+                break
+            ring.submit()
+            completed = 0
+            for i, res in ring.reap():
+                if res < 0:
+                    raise OSError(-res, os.strerror(-res), device)
+                if res != lengths[i]:
+                    raise OSError(errno.EIO, "short write (%d of %d bytes)" % (res, lengths[i]), device)
+                if align == 1:
+                    os.posix_fadvise(out_fd, offsets[i], res, os.POSIX_FADV_DONTNEED)
+                completed += sizes[i]
+                free.append(i)
+                inflight -= 1
+            tracker.add(completed)
+        os.fsync(out_fd)
+        print(f"Wrote {offset} bytes to {device}")
+    finally:
+        # tear the ring down before unmapping memory it may still reference
+        ring.close()
+        for m in (iso, tail):
+            if m is not None:
+                m.close()
+        if out_fd >= 0:
+            os.close(out_fd)
+        if in_fd >= 0:
+            os.close(in_fd)
+
+
+# errnos meaning "this copy primitive does not support these fds"
+_COPY_UNSUPPORTED = {errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP,
+                     errno.ENOTSUP, errno.EXDEV}
+SENDFILE_CHUNK = 64 << 20
+
+
+# Each copier runs from the current file positions to EOF, so a fallback
+# picks up where the previous one stopped.
+def _copy_sendfile(in_fd, out_fd, bs, tracker):
+    while True:
+        n = os.sendfile(out_fd, in_fd, None, SENDFILE_CHUNK)
+        if not n:
+            break
+        tracker.add(n)
+
+
+def _copy_file_range(in_fd, out_fd, bs, tracker):
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range not available")
+    while True:
+        n = os.copy_file_range(in_fd, out_fd, SENDFILE_CHUNK)
+        if not n:
+            break
+        tracker.add(n)
+
+
+def _copy_readwrite(in_fd, out_fd, bs, tracker):
+    buf = bytearray(bs)
+    view = memoryview(buf)
+    while True:
+        n = os.readv(in_fd, [buf])
+        if not n:
+            break
+        done = 0
+        while done < n:
+            done += os.write(out_fd, view[done:n])
+        tracker.add(n)
+
+
+def write_iso_sendfile(device, iso_path, bs=URING_CHUNK, progress=None, size=None):
+    # In-kernel copy for when io_uring is unavailable: sendfile, then
+    # copy_file_range, then a plain read/write loop as the last resort.
+    # Only Linux accepts sendfile(offset=None) to a non-socket (macOS/BSD
+    # raise TypeError), so other systems go straight to the read/write loop.
+    in_fd = os.open(iso_path, os.O_RDONLY)
+    try:
+        out_fd = os.open(device, os.O_WRONLY)
+        try:
+            if size is None:
+                size = os.fstat(in_fd).st_size
+            tracker = _Progress(size, progress)
+            copiers = (_copy_sendfile, _copy_file_range, _copy_readwrite) if SYSTEM == "Linux" else (_copy_readwrite,)
+            for copy in copiers:
+                try:
+                    copy(in_fd, out_fd, bs, tracker)
+                    break
+                except OSError as e:
+                    if e.errno not in _COPY_UNSUPPORTED or copy is _copy_readwrite:
+                        raise
+            os.fsync(out_fd)
+            print(f"Wrote {os.lseek(out_fd, 0, os.SEEK_CUR)} bytes to {device}")
+        finally:
+            os.close(out_fd)
+    finally:
+        os.close(in_fd)
+
+
+def write_iso_stream(device, iso_path, bs=URING_CHUNK, progress=None):
+    # Sources with no usable size (pipes, process substitution, ...): copy
+    # with read/write until EOF, like dd did.
+    in_fd = os.open(iso_path, os.O_RDONLY)
+    try:
+        out_fd = os.open(device, os.O_WRONLY)
+        try:
+            tracker = _Progress(None, progress)
+            _copy_readwrite(in_fd, out_fd, bs, tracker)
+            os.fsync(out_fd)
+            if progress is not None:
+                progress(tracker.done, tracker.done)
+            print(f"Wrote {tracker.done} bytes to {device}")
+        finally:
+            os.close(out_fd)
+    finally:
+        os.close(in_fd)
+
+
+def _stat_iso(iso_path):
+    # One stat gives both existence and the type/size the writers need
+    try:
+        return os.stat(iso_path)
+    except (FileNotFoundError, NotADirectoryError):
         raise SystemExit("ISO file not found: " + iso_path)
-    bs = "4M"
-    conv = "status=progress conv=fsync"
-    cmd = ["dd", f"if={iso_path}", f"of={device}", f"bs={bs}", conv]
-    print("Running:", " ".join(cmd))
+
+
+def _source_size(iso_path, st):
+    # Byte count of the ISO source, or None if it can only be read to EOF.
+    if stat.S_ISREG(st.st_mode):
+        return st.st_size
+    if stat.S_ISBLK(st.st_mode) and SYSTEM == "Linux":
+        fd = os.open(iso_path, os.O_RDONLY)
+        try:
+            return _block_device_size(fd)
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+    return None
+
+
+def write_iso_unix(device, iso_path, progress=print_progress):
+    # Prefer the in-process io_uring writer; sendfile is the fallback.
+    # Sources of unknown size are streamed to EOF instead.
+    # This will overwrite the entire device.
+    size = _source_size(iso_path, _stat_iso(iso_path))
+    bs = choose_block_size(device)
+    if size is None:
+        print(f"{iso_path} is not a regular file; copying until EOF")
+        try:
+            write_iso_stream(device, iso_path, bs, progress)
+        except OSError as e:
+            print("Write failed:", e)
+        return
     try:
-        subprocess.check_call(cmd)
-    except subprocess.CalledProcessError as e:
-        print("dd failed:", e)
+        write_iso_uring(device, iso_path, bs, progress, size)
+        return
+    except UringUnavailable as e:
+        print("io_uring unavailable (%s); falling back to sendfile/read-write copy" % e)
+    except OSError as e:
+        print("io_uring write failed:", e)
+        return
+    try:
+        write_iso_sendfile(device, iso_path, bs, progress, size)
+    except OSError as e:
+        print("Write failed:", e)
+
+
+def _block_device_size(fd):
+    return struct.unpack("Q", fcntl.ioctl(fd, BLKGETSIZE64, b"\0" * 8))[0]
+
+
+def discard_device(device):
+    # TRIM the whole device (BLKDISCARD) so the flash controller starts from
+    # erased blocks instead of doing read-modify-write during the ISO write.
+    fd = os.open(device, os.O_RDWR)
+    try:
+        try:
+            size = _block_device_size(fd)
+            fcntl.ioctl(fd, BLKDISCARD, struct.pack("QQ", 0, size))
+        except OSError as e:
+            if e.errno in (errno.ENOTTY, errno.EOPNOTSUPP, errno.EINVAL):
+                print(f"{device} does not support discard; skipping")
+                return
+            raise
+        print(f"Discarded {size} bytes on {device}")
+    finally:
+        os.close(fd)
 
 
 def write_iso_windows(device_number, iso_path):
@@ -173,6 +895,137 @@ def write_iso_windows(device_number, iso_path):
     raise SystemExit("Windows raw write not implemented. Use Rufus or Win32 Disk Imager on Windows.")
 
 
+# --------- Verification ---------
+VERIFY_DEPTH = 32
+VERIFY_CHUNK = 1 << 20
+
+
+def _open_readback(device):
+    # O_DIRECT so the read-back comes from the device, not the page cache
+    try:
+        fd = os.open(device, os.O_RDONLY | os.O_DIRECT)
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+        print(f"O_DIRECT not supported on {device}; dropping its cached pages before reading back")
+        fd = os.open(device, os.O_RDONLY)
+        # pages are clean after the write's fsync, so this evicts them all
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        return fd, 1
+    return fd, _logical_block_size(fd)
+
+
+def verify_iso_uring(device, iso_path, size=None):
+    # Read the ISO and the device back in VERIFY_CHUNK pieces with up to
+    # VERIFY_DEPTH pairs of READ_FIXED in flight, and memcmp each pair as
+    # soon as both halves land. user_data = slot << 1 | side (0 ISO, 1 device).
+    ring = _open_uring()
+    bufs = []
+    iso_fd = dev_fd = -1
+    try:
+        bufs = [mmap.mmap(-1, VERIFY_CHUNK) for _ in range(2 * VERIFY_DEPTH)]
+        try:
+            ring.register_buffers(bufs)
+        except OSError as e:
+            raise UringUnavailable("io_uring_register_buffers failed: %s" % e) from e
+        iso_fd = os.open(iso_path, os.O_RDONLY)
+        dev_fd, align = _open_readback(device)
+        if size is None:
+            size = os.fstat(iso_fd).st_size
+        addrs = [_addr(b) for b in bufs]
+        lengths = [0] * VERIFY_DEPTH
+        offsets = [0] * VERIFY_DEPTH
+        pending = [0] * VERIFY_DEPTH
+        free = list(range(VERIFY_DEPTH))
+        memcmp = _get_libc().memcmp
+        offset = 0
+        inflight = 0
+        while True:
+            while free and offset < size:
+                i = free.pop()
+                n = min(VERIFY_CHUNK, size - offset)
+                _prep_rw(ring.get_sqe(), IORING_OP_READ_FIXED, iso_fd, addrs[2 * i], n,
+                         offset, i << 1, 2 * i)
+                _prep_rw(ring.get_sqe(), IORING_OP_READ_FIXED, dev_fd, addrs[2 * i + 1],
+                         -(-n // align) * align, offset, i << 1 | 1, 2 * i + 1)
+                lengths[i] = n
+                offsets[i] = offset
+                pending[i] = 2
+                offset += n
+                inflight += 1
+            if not inflight:
+                break
+            ring.submit()
+            for user_data, res in ring.reap():
+                i, side = user_data >> 1, user_data & 1
+                path = (iso_path, device)[side]
+                if res < 0:
+                    raise OSError(-res, os.strerror(-res), path)
+                if res < lengths[i]:
+                    raise OSError(errno.EIO, "short read (%d of %d bytes)" % (res, lengths[i]), path)
+                pending[i] -= 1
+                if pending[i]:
+                    continue
+                if memcmp(addrs[2 * i], addrs[2 * i + 1], lengths[i]):
+                    iso_buf, dev_buf = bufs[2 * i], bufs[2 * i + 1]
+                    k = next(k for k in range(lengths[i]) if iso_buf[k] != dev_buf[k])
+                    print(f"Verify failed: {device} differs from {iso_path} at byte {offsets[i] + k}")
+                    return False
+                free.append(i)
+                inflight -= 1
+        print(f"Verified {size} bytes on {device}")
+        return True
+    finally:
+        if dev_fd >= 0:
+            os.close(dev_fd)
+        if iso_fd >= 0:
+            os.close(iso_fd)
+        ring.close()
+        for b in bufs:
+            b.close()
+
+
+def verify_iso_hash(device, iso_path, bs=URING_CHUNK, size=None):
+    # Fallback: SHA-256 of the ISO and of the same number of bytes on the device.
+    if size is None:
+        size = os.stat(iso_path).st_size
+    digests = []
+    for path in (iso_path, device):
+        h = hashlib.sha256()
+        remaining = size
+        with open(path, "rb", buffering=0) as f:
+            if path == device and hasattr(os, "posix_fadvise"):
+                # drop cached pages left by the write so we read the device
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            while remaining:
+                chunk = f.read(min(bs, remaining))
+                if not chunk:
+                    break
+                h.update(chunk)
+                remaining -= len(chunk)
+        digests.append(h.hexdigest())
+    print(f"SHA-256 {iso_path}: {digests[0]}")
+    print(f"SHA-256 {device}: {digests[1]}")
+    if digests[0] != digests[1]:
+        print(f"Verify failed: {device} does not match {iso_path}")
+        return False
+    print(f"Verified {size} bytes on {device}")
+    return True
+
+
+def verify_iso(device, iso_path):
+    size = _source_size(iso_path, _stat_iso(iso_path))
+    if size is None:
+        # a pipe was consumed by the write and cannot be read a second time
+        print(f"Cannot verify: {iso_path} is not a regular file or block device")
+        return False
+    try:
+        return verify_iso_uring(device, iso_path, size)
+    except UringUnavailable as e:
+        print("io_uring unavailable (%s); verifying with SHA-256" % e)
+    return verify_iso_hash(device, iso_path, size=size)
+
+
 # --------- Confirmation helper ---------
 
 def confirm(target):
@@ -194,6 +1047,8 @@ def main():
     parser.add_argument("--iso", help="Path to ISO file to write (raw write)")
     parser.add_argument("--parttable", choices=["gpt", "mbr"], help="Partition table to create before writing (optional)")
     parser.add_argument("--format", help="Create partition and format with FS (ext4, vfat, ntfs) after making parttable")
+    parser.add_argument("--discard", action="store_true", help="TRIM the whole device before partitioning/writing (Linux)")
+    parser.add_argument("--verify", action="store_true", help="Read the device back after writing and compare with the ISO")
     parser.add_argument("--yes", action="store_true", help="Assume yes for confirmations (dangerous)")
 
     args = parser.parse_args()
@@ -204,39 +1059,66 @@ def main():
 
     if not args.target:
         parser.error("--target is required unless --list is used")
+    if args.verify and not args.iso:
+        parser.error("--verify requires --iso")
 
     check_root()
-    system = platform.system()
     target = args.target
 
     if not args.yes:
         confirm(target)
 
+    # Discard first: it erases everything, including a fresh partition table
+    if args.discard:
+        if SYSTEM == "Linux":
+            try:
+                discard_device(target)
+            except OSError as e:
+                print("discard failed:", e)
+        else:
+            print("--discard is only supported on Linux; skipping")
+
     # If user asked to create partition table
     if args.parttable:
-        if system in ("Linux", "Darwin"):
+        if SYSTEM in ("Linux", "Darwin"):
             print(f"Creating partition table {args.parttable} on {target}")
-            create_partition_table_unix(target, args.parttable)
             if args.format:
-                format_partition_unix(target, args.format)
-        elif system == "Windows":
+                partition_and_format_unix(target, args.parttable, args.format)
+            else:
+                create_partition_table_unix(target, args.parttable)
+        elif SYSTEM == "Windows":
             print("Windows partitioning/formatting path")
             # Create diskpart script
             ps = f"select disk {target}\nclean\nconvert {args.parttable}\ncreate partition primary\nformat fs={args.format} quick\nassign\nexit\n"
             print("Running diskpart script (requires admin)")
-            pfile = "/tmp/diskpart_script.txt" if platform.system() != "Windows" else "diskpart_script.txt"
-            with open(pfile, "w") as f:
+            # Unique per run and fully on disk before diskpart opens it
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
                 f.write(ps)
+                f.flush()
+                os.fsync(f.fileno())
+                pfile = f.name
             try:
                 subprocess.check_call(["diskpart", "/s", pfile])
             except Exception as e:
                 print("diskpart failed:", e)
+            finally:
+                os.unlink(pfile)
 
     # If user asked to write ISO raw
     if args.iso:
-        if system in ("Linux", "Darwin"):
+        if SYSTEM in ("Linux", "Darwin"):
             write_iso_unix(target, args.iso)
-        elif system == "Windows":
+            if args.verify:
+                try:
+                    ok = verify_iso(target, args.iso)
+                except OSError as e:
+                    print("Verify failed:", e)
+                    ok = False
+                if not ok:
+                    sys.exit(1)
+        elif SYSTEM == "Windows":
+            if args.verify:
+                print("--verify is not supported on Windows; skipping verification")
             write_iso_windows(target, args.iso)
 
     print("Done. Remember to safely eject the device.")